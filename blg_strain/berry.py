@@ -2,8 +2,28 @@ import numpy as np
 
 from .hamiltonian import dH_4x4
 from .utils.const import q, hbar, muB
+from .utils.linalg import HAS_NUMBA, get_array_module
 
-def berry_mu(Kxa, Kya, sl, E, Psi, einsum=True):
+if HAS_NUMBA:
+    from numba import njit, prange
+
+# Contraction paths for the einsums below, keyed by operand shapes. Planning
+# the path costs ~ms per np.einsum call; the shapes repeat across calls in a
+# parameter sweep, so plan once and reuse.
+_einsum_paths = {}
+
+def _einsum_path(subscripts, *operands):
+    key = (subscripts,) + tuple(op.shape for op in operands)
+    if key not in _einsum_paths:
+        # plan on zero-stride dummies so this works without touching the
+        # operand data (which may live on the GPU)
+        dummies = [np.broadcast_to(np.zeros(1, dtype=op.dtype), op.shape)
+                    for op in operands]
+        _einsum_paths[key], _ = np.einsum_path(subscripts, *dummies,
+                                    optimize='optimal')
+    return _einsum_paths[key]
+
+def berry_mu(Kxa, Kya, sl, E, Psi, dH=None, out=None):
     '''
     Calculates the Berry curvature and magnetic moment given the energy
     eigenvalues and eigenvectors for N(=4) bands.
@@ -12,54 +32,155 @@ def berry_mu(Kxa, Kya, sl, E, Psi, einsum=True):
     - Kxa, Kya: Nkx x Nky array of wave vectors (1/a0)
     - E: N(=4) x Nkx x Nky array of energy eigenvalues
     - Psi: N(=4) x N(=4) x Nkx x Nky array of energy eigenvectors.
-      The first dimension indexes the band, and the second dimension indexes
-      components of the eigenvectors.
-    - einsum: if True, use `np.einsum` to multiply (faster than `np.tensordot`)
+      The first dimension indexes the components of the eigenvectors, and the
+      second dimension indexes the band (the layout returned by `get_bands`).
+    - dH: optional tuple (H_dkx, H_dky) of precomputed Hamiltonian derivatives
+      (as returned by `hamiltonian.dH_4x4`). The derivatives do not depend on
+      Delta, so a parameter sweep over the same k grid can compute them once
+      and pass them to every call. If None, they are computed here.
+    - out: optional tuple (Omega, Mu) of preallocated N x Nkx x Nky float
+      arrays to write the results into. Lets sweep drivers allocate the
+      (large) output arrays once outside the loop instead of on every call.
+      Buffers should be C-contiguous for the compiled kernel to write into
+      them directly; non-contiguous buffers fall back to the einsum path.
 
     Returns:
     - Omega: n(=4) x Nkx x Nky array of Berry curvature (units m^2)
     - Mu: n(=4) x Nkx x Nky array of magnetic moment (units A * m^2)
+
+    If the inputs are cupy arrays, the whole computation runs on the GPU (via
+    the einsum implementation) and cupy arrays are returned.
     '''
 
-    hdkx, hdky = dH_4x4(Kxa, Kya, sl)
-
-    Omega = np.zeros_like(Psi, dtype='float')  # N x N x Nkx x Nky; first dim
-    Mu = np.zeros_like(Psi, dtype='float')     # summed over bands m != n
-
-    for n, (e_n, psi_n) in enumerate(zip(E, Psi)):
-        for m, (e_m, psi_m) in enumerate(zip(E, Psi)):
-            if n == m: # sum runs over m != n
-                continue
-
-            if einsum:
-                # Calculate matrix products using einstein notation
-                # These are inner products <n|H'|m> (H' derivative of Hamiltonian)
-                # i and l index the components of the eigenvectors for bands n and m
-                # the H' matrix is indexed with il to contract these indices
-                # j and k index over the kx, ky points and are the dimensions left
-                prod1 = np.einsum('ijk,iljk,ljk->jk', psi_n.conj(), hdkx, psi_m,
-                                    optimize=True)
-                prod2 = np.einsum('ijk,iljk,ljk->jk', psi_m.conj(), hdky, psi_n,
-                                    optimize=True)
-            else:
-                # Equivalent method (slower!)
-                # We want C = A * H * B, or c_jk = A_ijk * H_il * B_ljk
-                # First sum over l using tensordot
-                # Dot product over LAST axis of H and FIRST axis of B
-                D1 = np.tensordot(hdkx, psi_m, axes=([-1], [0]))
-                D2 = np.tensordot(hdky, psi_n, axes=([-1], [0]))
-                # Now we have C = A * D, or c_jk = A_ijk * D_ijk
-                # We want to sum over i only, so multiply then sum over axis 0
-                prod1 = np.sum(np.multiply(psi_n.conj(), D1), axis=0)
-                prod2 = np.sum(np.multiply(psi_m.conj(), D2), axis=0)
-
-            Omega[m, n] = np.imag(np.multiply(prod1, prod2) / (e_n - e_m) ** 2)
-            Mu[m, n] = np.imag(np.multiply(prod1, prod2) / (e_n - e_m))
-
-    Omega = Omega.sum(axis=0)  # perform the sum over bands
-    Mu = Mu.sum(axis=0)
-
-    Omega = -2 * Omega  # m^2
-    Mu = -q / hbar * Mu  # A * m^2
+    if dH is None:
+        dH = dH_4x4(Kxa, Kya, sl)
+    hdkx, hdky = dH
+
+    xp = get_array_module(E, Psi)
+    if out is None:
+        Omega = xp.empty(E.shape)
+        Mu = xp.empty(E.shape)
+    else:
+        Omega, Mu = out
+
+    # compiled kernel is specialized to 4 bands and host (numpy) arrays, and
+    # needs C-contiguous outputs (the (N, Nk) reshape below must be a view,
+    # not a copy the caller never sees); the einsum path handles everything
+    # else on whichever device the arrays live on
+    if HAS_NUMBA and E.shape[0] == 4 and xp is np \
+            and Omega.flags.c_contiguous and Mu.flags.c_contiguous:
+        N = E.shape[0]
+        # Flatten the k grid and put the small band/component dimensions last
+        # and contiguous, so the compiled kernel works on local 4x4 blocks
+        Ek = np.ascontiguousarray(E.reshape(N, -1).T)
+        # Psi is (component, band, ...) - the kernel wants (Nk, band, comp)
+        Psik = np.ascontiguousarray(Psi.reshape(N, N, -1).transpose(2, 1, 0))
+        hxk = np.ascontiguousarray(hdkx.reshape(N, N, -1).transpose(2, 0, 1))
+        hyk = np.ascontiguousarray(hdky.reshape(N, N, -1).transpose(2, 0, 1))
+
+        # the (N, Nk) reshapes are views, so the kernel writes directly into
+        # the output buffers
+        _berry_mu_core(Ek, Psik, hxk, hyk,
+                        Omega.reshape(N, -1), Mu.reshape(N, -1))
+    else:
+        # Matrix elements <n|H'|m> (H' derivative of Hamiltonian) for all
+        # pairs of bands n, m at once. i and l index the components of the
+        # eigenvectors for bands n and m (the first dimension of Psi); the H'
+        # matrix is indexed with il to contract these indices; j and k index
+        # over the kx, ky points and are the dimensions left
+        path = _einsum_path('injk,iljk,lmjk->nmjk', Psi.conj(), hdkx, Psi)
+        Mx = np.einsum('injk,iljk,lmjk->nmjk', Psi.conj(), hdkx, Psi,
+                            optimize=path)
+        My = np.einsum('injk,iljk,lmjk->nmjk', Psi.conj(), hdky, Psi,
+                            optimize=path)
+
+        # numerator <n|H_dkx|m><m|H_dky|n>, i.e. Mx[n, m] * My[m, n]
+        num = np.imag(Mx * My.swapaxes(0, 1))  # N x N x Nkx x Nky
+
+        Ediff = E[:, np.newaxis] - E[np.newaxis, :]  # Ediff[n, m] = E_n - E_m
+
+        # The sum runs over m != n; zero the numerator on the diagonal (and
+        # avoid dividing by Ediff = 0 there)
+        d = np.arange(E.shape[0])
+        num[d, d] = 0
+        Ediff[d, d] = 1
+
+        # perform the sums over bands m in place in the output buffers,
+        # reusing num for both divides
+        np.divide(num, Ediff, out=num)
+        num.sum(axis=1, out=Mu)
+        np.divide(num, Ediff, out=num)
+        num.sum(axis=1, out=Omega)
+
+    Omega *= -2  # m^2
+    Mu *= -q / hbar  # A * m^2
 
     return Omega, Mu
+
+
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _berry_mu_core(E, Psi, hdkx, hdky, Omega, Mu):  # pragma: no cover
+        '''
+        Berry curvature / magnetic moment numerators (before physical
+        prefactors), computed per k point with explicit loops over the small
+        band/component indices. Specialized to N=4 bands: the H'|m> products
+        are unrolled with the sparsity pattern of `hamiltonian.dH_4x4`.
+
+        Params:
+        - E: (Nk, N) eigenvalues
+        - Psi: (Nk, N, N) eigenvectors; Psi[k, n] is the eigenvector of band n
+        - hdkx, hdky: (Nk, N, N) Hamiltonian derivative matrices
+        - Omega, Mu: (N, Nk) output arrays, overwritten with the sums over
+          bands m != n of Im[<n|H_dkx|m><m|H_dky|n>] / (E_n - E_m)^(2 or 1)
+        '''
+        Nk, N = E.shape
+
+        for k in prange(Nk):
+            # H'|m> for each band m, unrolled with the known sparsity of
+            # dH_4x4: the (2, 3) and (3, 2) entries are the (k-independent)
+            # gamma1 dimer coupling, so their derivatives vanish
+            vx = np.empty((N, N), dtype=Psi.dtype)
+            vy = np.empty((N, N), dtype=Psi.dtype)
+            hx = hdkx[k]
+            hy = hdky[k]
+            for m in range(N):
+                p0 = Psi[k, m, 0]
+                p1 = Psi[k, m, 1]
+                p2 = Psi[k, m, 2]
+                p3 = Psi[k, m, 3]
+                vx[m, 0] = hx[0, 0]*p0 + hx[0, 1]*p1 + hx[0, 2]*p2 + hx[0, 3]*p3
+                vx[m, 1] = hx[1, 0]*p0 + hx[1, 1]*p1 + hx[1, 2]*p2 + hx[1, 3]*p3
+                vx[m, 2] = hx[2, 0]*p0 + hx[2, 1]*p1 + hx[2, 2]*p2
+                vx[m, 3] = hx[3, 0]*p0 + hx[3, 1]*p1 + hx[3, 3]*p3
+                vy[m, 0] = hy[0, 0]*p0 + hy[0, 1]*p1 + hy[0, 2]*p2 + hy[0, 3]*p3
+                vy[m, 1] = hy[1, 0]*p0 + hy[1, 1]*p1 + hy[1, 2]*p2 + hy[1, 3]*p3
+                vy[m, 2] = hy[2, 0]*p0 + hy[2, 1]*p1 + hy[2, 2]*p2
+                vy[m, 3] = hy[3, 0]*p0 + hy[3, 1]*p1 + hy[3, 3]*p3
+
+            # matrix elements <n|H'|m> = psi_n^dagger . (H'|m>)
+            Mx = np.empty((N, N), dtype=Psi.dtype)
+            My = np.empty((N, N), dtype=Psi.dtype)
+            for n in range(N):
+                for m in range(N):
+                    sx = 0j
+                    sy = 0j
+                    for i in range(N):
+                        pni = np.conj(Psi[k, n, i])
+                        sx += pni * vx[m, i]
+                        sy += pni * vy[m, i]
+                    Mx[n, m] = sx
+                    My[n, m] = sy
+
+            for n in range(N):
+                o = 0.
+                mu = 0.
+                for m in range(N):
+                    if n == m:  # sum runs over m != n
+                        continue
+                    num = (Mx[n, m] * My[m, n]).imag
+                    Ediff = E[k, n] - E[k, m]
+                    o += num / Ediff ** 2
+                    mu += num / Ediff
+                Omega[n, k] = o
+                Mu[n, k] = mu
@@ -13,10 +13,10 @@ def H_4x4(Kxa, Kya, sl, Delta=0):
 
     Returns:
     - H: Hamiltonian array shape 4 x 4 x Nkx x Nky
-    '''
-    # K vector
-    Ka = np.stack([Kxa, Kya], axis=-1)
 
+    The result has the array type of Kxa, Kya: all operations here dispatch
+    through the array protocols, so passing cupy arrays builds H on the GPU.
+    '''
     o = np.zeros_like(Kxa, dtype='complex128') # Array to give shape to const
 
     # Nearest-neighbor matrix elements
@@ -25,20 +25,21 @@ def H_4x4(Kxa, Kya, sl, Delta=0):
     H4 = o.copy()
     for (delta, gamma0, gamma3, gamma4) in zip(sl.deltas, sl.gamma0s,
                                                sl.gamma3s, sl.gamma4s):
-        H0 += -gamma0 * np.exp(1j * Ka.dot(delta))
-        H3 += gamma3 * np.exp(-1j * Ka.dot(delta))
-        H4 += gamma4 * np.exp(1j * Ka.dot(delta))
+        Kdotd = Kxa * delta[0] + Kya * delta[1]  # K . delta, elementwise
+        H0 += -gamma0 * np.exp(1j * Kdotd)
+        H3 += gamma3 * np.exp(-1j * Kdotd)
+        H4 += gamma4 * np.exp(1j * Kdotd)
 
     # Next-nearest neighbor matrix element
     Hn = o.copy()
     for (deltan, gamman) in zip(sl.deltans, sl.gammans):
-        Hn += -gamman * np.exp(1j * Ka.dot(deltan))
+        Hn += -gamman * np.exp(1j * (Kxa * deltan[0] + Kya * deltan[1]))
 
-    H = np.array([
-        [-Delta / 2 + Hn, H3, H4, H0],
-        [H3.conj(), Delta/2 + Hn, H0.conj(), H4.conj()],
-        [H4.conj(), H0, Delta/2 + Hn + sl.dimer, gamma1 + o],
-        [H0.conj(), H4, gamma1 + o, -Delta/2 + Hn + sl.dimer]
+    H = np.stack([
+        np.stack([-Delta / 2 + Hn, H3, H4, H0]),
+        np.stack([H3.conj(), Delta/2 + Hn, H0.conj(), H4.conj()]),
+        np.stack([H4.conj(), H0, Delta/2 + Hn + sl.dimer, gamma1 + o]),
+        np.stack([H0.conj(), H4, gamma1 + o, -Delta/2 + Hn + sl.dimer])
     ]) # Using "o" gives elements proper shape
 
     return H
@@ -55,10 +56,10 @@ def dH_4x4(Kxa, Kya, sl):
 
     Returns:
     H_dkx, H_dky: derivatives of H, shape 4 x 4 x Nkx x Nky
-    '''
-    # K vector
-    Ka = np.stack([Kxa, Kya], axis=-1)
 
+    As for `H_4x4`, passing cupy arrays for Kxa, Kya builds the derivatives
+    on the GPU.
+    '''
     o = np.zeros_like(Kxa, dtype='complex128') # Array to give shape to const
 
     # Nearest-neighbor matrix elements
@@ -70,35 +71,37 @@ def dH_4x4(Kxa, Kya, sl):
     dH4y = o.copy()
     for (delta, gamma0, gamma3, gamma4) in zip(sl.deltas, sl.gamma0s,
                                                sl.gamma3s, sl.gamma4s):
-        dH0x += -gamma0 * np.exp(1j * Ka.dot(delta)) * 1j * delta[0]
-        dH0y += -gamma0 * np.exp(1j * Ka.dot(delta)) * 1j * delta[1]
+        phase = np.exp(1j * (Kxa * delta[0] + Kya * delta[1]))
+        dH0x += -gamma0 * phase * 1j * delta[0]
+        dH0y += -gamma0 * phase * 1j * delta[1]
         # H3 involves hopping with bond vectors delta that have negative
         # components compared to other bonds. So this negative sign does NOT
         # appear in front of the derivative when doing the chain rule.
-        dH3x += gamma3 * np.exp(-1j * Ka.dot(delta)) * 1j * delta[0]
-        dH3y += gamma3 * np.exp(-1j * Ka.dot(delta)) * 1j * delta[1]
-        dH4x += gamma4 * np.exp(1j * Ka.dot(delta)) * 1j * delta[0]
-        dH4y += gamma4 * np.exp(1j * Ka.dot(delta)) * 1j * delta[1]
+        dH3x += gamma3 * phase.conj() * 1j * delta[0]
+        dH3y += gamma3 * phase.conj() * 1j * delta[1]
+        dH4x += gamma4 * phase * 1j * delta[0]
+        dH4y += gamma4 * phase * 1j * delta[1]
 
     # Next-nearest neighbor matrix element
     dHnx = o.copy()
     dHny = o.copy()
     for (deltan, gamman) in zip(sl.deltans, sl.gammans):
-        dHnx += -gamman * np.exp(1j * Ka.dot(deltan)) * 1j * deltan[0]
-        dHny += -gamman * np.exp(1j * Ka.dot(deltan)) * 1j * deltan[1]
+        phase = np.exp(1j * (Kxa * deltan[0] + Kya * deltan[1]))
+        dHnx += -gamman * phase * 1j * deltan[0]
+        dHny += -gamman * phase * 1j * deltan[1]
 
     # Multiply by a0 to make the derivative w.r.t. kx or ky, not kx*a0
-    H_dkx = a0 * np.array([
-        [dHnx, dH3x, dH4x, dH0x],
-        [dH3x.conj(), dHnx, dH0x.conj(), dH4x.conj()],
-        [dH4x.conj(), dH0x, dHnx, o],
-        [dH0x.conj(), dH4x, o, dHnx]
+    H_dkx = a0 * np.stack([
+        np.stack([dHnx, dH3x, dH4x, dH0x]),
+        np.stack([dH3x.conj(), dHnx, dH0x.conj(), dH4x.conj()]),
+        np.stack([dH4x.conj(), dH0x, dHnx, o]),
+        np.stack([dH0x.conj(), dH4x, o, dHnx])
     ]) # Using "o" gives elements proper shape
-    H_dky = a0 * np.array([
-        [dHny, dH3y, dH4y, dH0y],
-        [dH3y.conj(), dHny, dH0y.conj(), dH4y.conj()],
-        [dH4y.conj(), dH0y, dHny, o],
-        [dH0y.conj(), dH4y, o, dHny]
+    H_dky = a0 * np.stack([
+        np.stack([dHny, dH3y, dH4y, dH0y]),
+        np.stack([dH3y.conj(), dHny, dH0y.conj(), dH4y.conj()]),
+        np.stack([dH4y.conj(), dH0y, dHny, o]),
+        np.stack([dH0y.conj(), dH4y, o, dHny])
     ]) # Using "o" gives elements proper shape
 
     return H_dkx, H_dky
@@ -21,6 +21,8 @@ def n_valley_layer(kxa, kya, feq, Psi, layer=1):
     - kxa, kya: Nkx, Nky arrays of kxa, kya points
     - feq: N(=4) x Nkx x Nky array of occupation for a given valley
     - Psi: N(=4) x N(=4) x Nkx x Nky array of eigenstates for a given valley
+      (components in the first dimension, band in the second, as returned by
+      `get_bands`)
     - layer: layer number (1 or 2)
     '''
     assert feq.shape[0] == 4, 'Need 4x4 Hamiltonian to compute density by layer'
@@ -33,9 +35,9 @@ def n_valley_layer(kxa, kya, feq, Psi, layer=1):
     check_f_boundaries(feq)
 
     if layer == 1:
-        weight = abs(Psi[:, 0, :, :]) ** 2 + abs(Psi[:, 3, :, :]) ** 2
+        weight = abs(Psi[0]) ** 2 + abs(Psi[3]) ** 2  # N x Nkx x Nky
     else:
-        weight = abs(Psi[:, 1, :, :]) ** 2 + abs(Psi[:, 2, :, :]) ** 2
+        weight = abs(Psi[1]) ** 2 + abs(Psi[2]) ** 2
 
     integrand = (2 * 2 / (2 * np.pi * a0) ** 2) * feq * weight
     # The integrand is an N(=4) x Nkx x Nky array
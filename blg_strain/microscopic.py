@@ -4,6 +4,8 @@ import numpy as np
 from .utils.const import kB, hbar, hbar_J, m_e, a0, q
 from scipy.interpolate import RectBivariateSpline
 from scipy.integrate import simps
+from scipy.ndimage import correlate1d
+from scipy.special import expit
 
 def feq_func(E, EF, T=0):
     '''
@@ -11,16 +13,59 @@ def feq_func(E, EF, T=0):
     determine hole occupation, take -(1-feq) (such that carrier density is
     negative for hole doping).
 
+    Uses `scipy.special.expit` (logistic sigmoid), which saturates to 0/1
+    rather than overflowing `np.exp` for energies far from the Fermi level.
+    The temperature is clamped to a tiny positive value so that T=0 gives the
+    zero-temperature step function without dividing by zero.
+
     Arguments:
     - E: Energy (eV) - an array with arbitrary dimensions
     - EF: Fermi level (eV)
     - T: Temperature (K)
     '''
+    return expit(-(E - EF) / (kB * max(T, 1e-10)))
+
+
+def meff_func(kxa, kya, E):
+    '''
+    Effective mass tensor for each band, calculated from the band curvature.
+    The inverse effective mass tensor is (1 / hbar^2) * d^2E / dk_i dk_j; the
+    effective mass tensor is its (2x2) matrix inverse, computed in closed form
+    rather than with `np.linalg.inv` (LAPACK is overkill for 2x2 blocks).
+
+    Arguments:
+    - kxa, kya: Nkx, Nky arrays of kxa, kya points
+    - E: N(=4) x Nkx x Nky array of energy eigenvalues (eV)
+
+    Returns:
+    - meff: N(=4) x Nkx x Nky x 2 x 2 array of effective mass (units of the
+      bare electron mass m_e)
+    '''
+    kx = kxa / a0  # 1/m
+    ky = kya / a0
+    hx = kx[1] - kx[0]  # grids are uniform
+    hy = ky[1] - ky[0]
 
-    with np.errstate(divide='ignore', over='ignore'):
-        f = 1 / (1 + np.exp((E - EF) / (kB * T)))
+    # Second derivatives in a single 3-point stencil pass per term, rather
+    # than two nested np.gradient sweeps (which also widen the stencil).
+    # The mixed partials are analytically equal, so only one is computed
+    # (a separable central-difference stencil along each axis).
+    E_dkx_dkx = correlate1d(E, [1., -2., 1.], axis=-2, mode='nearest') / hx**2
+    E_dky_dky = correlate1d(E, [1., -2., 1.], axis=-1, mode='nearest') / hy**2
+    E_dkx_dky = correlate1d(
+                    correlate1d(E, [-.5, 0., .5], axis=-2, mode='nearest'),
+                    [-.5, 0., .5], axis=-1, mode='nearest') / (hx * hy)
 
-    return f
+    det = E_dkx_dkx * E_dky_dky - E_dkx_dky ** 2
+
+    meff = np.empty((*E.shape, 2, 2))
+    meff[..., 0, 0] = E_dky_dky / det
+    meff[..., 0, 1] = -E_dkx_dky / det
+    meff[..., 1, 0] = meff[..., 0, 1]
+    meff[..., 1, 1] = E_dkx_dkx / det
+    meff *= hbar ** 2 / m_e  # hbar in eV*s and m_e in eV*s^2/m^2 (J -> eV)
+
+    return meff
 
 
 def f_relaxation(kxa, kya, splE, EF, T, Efield, tau, N):
@@ -62,12 +107,11 @@ def check_f_boundaries(f, thresh=0.01):
     '''
     assert f.ndim == 3 # n x Nkx x Nky
 
-    for n in range(f.shape[0]): # loop over bands
-        below_threshold = True # threshold to check if FD is small enough at boundaries of k-space
-        for i in [0, -1]:
-            if (f[n, i, :] > thresh).any():
-                below_threshold = False
-            elif (f[n, :, i] > thresh).any():
-                below_threshold = False
-        if not below_threshold:
-            print('F-D dist in band %i not smaller than %f at boundaries!' %(n, thresh))
+    # Gather the four boundaries of k-space into one Nband x (2Nky + 2Nkx)
+    # array and reduce in a single pass (no Python loop over bands/edges)
+    edges = np.concatenate([f[:, 0, :], f[:, -1, :], f[:, :, 0], f[:, :, -1]],
+                            axis=1)
+    above_threshold = (edges > thresh).any(axis=1)
+
+    for n in np.flatnonzero(above_threshold):
+        print('F-D dist in band %i not smaller than %f at boundaries!' %(n, thresh))
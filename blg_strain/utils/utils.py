@@ -147,7 +147,11 @@ def make_grid(xlims=[-0.35e9, .35e9], ylims=[-0.35e9, .35e9], Nx=200,
     kx = np.linspace(xlims[0], xlims[1], Nx)
     ky = np.linspace(ylims[0], ylims[1], Ny)
 
-    Kx, Ky = np.meshgrid(kx, ky, indexing='ij')
+    # Read-only broadcast views equivalent to
+    # np.meshgrid(kx, ky, indexing='ij') but without allocating two dense
+    # Nx x Ny arrays; all consumers do elementwise (broadcastable) ops
+    Kx = np.broadcast_to(kx[:, np.newaxis], (Nx, Ny))
+    Ky = np.broadcast_to(ky[np.newaxis, :], (Nx, Ny))
 
     return kx, ky, Kx, Ky
 